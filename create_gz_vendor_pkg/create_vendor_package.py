@@ -1,7 +1,6 @@
 import argparse
 import sys
 from catkin_pkg.package import (
-    Dependency,
     InvalidPackage,
     parse_package,
     parse_package_string,
@@ -9,31 +8,37 @@ from catkin_pkg.package import (
 )
 import re
 import copy
+import functools
 import jinja2
 from pathlib import Path
 import os
 import shutil
 
 
+# Templates and static files used to generate the vendor packages.
+TEMPLATES_PATH = Path(__file__).resolve().parent / "templates"
+
 # These are the names of the libraries as they appear in package.xml files.
-GZ_LIBRARIES = [
-    "gz-cmake",
-    "gz-common",
-    "gz-fuel_tools",
-    "gz-gui",
-    "gz-launch",
-    "gz-math",
-    "gz-msgs",
-    "gz-physics",
-    "gz-plugin",
-    "gz-rendering",
-    "gz-sensors",
-    "gz-sim",
-    "gz-tools",
-    "gz-transport",
-    "gz-utils",
-    "sdformat",
-]
+GZ_LIBRARIES = frozenset(
+    {
+        "gz-cmake",
+        "gz-common",
+        "gz-fuel_tools",
+        "gz-gui",
+        "gz-launch",
+        "gz-math",
+        "gz-msgs",
+        "gz-physics",
+        "gz-plugin",
+        "gz-rendering",
+        "gz-sensors",
+        "gz-sim",
+        "gz-tools",
+        "gz-transport",
+        "gz-utils",
+        "sdformat",
+    }
+)
 
 EXTRA_VENDORED_PKGS = {
     "dartsim": "gz_dartsim_vendor",
@@ -43,10 +48,12 @@ EXTRA_VENDORED_PKGS = {
 }
 
 # These dependencies will be removed from the package.xml provided by the upstream Gazebo library
-DEPENDENCY_DISALLOW_LIST = [
-    # python3-distutiol is not needed for CMake > 3.12. Also, it is currently failing to install on Noble
-    "python3-distutils",
-]
+DEPENDENCY_DISALLOW_LIST = frozenset(
+    {
+        # python3-distutiol is not needed for CMake > 3.12. Also, it is currently failing to install on Noble
+        "python3-distutils",
+    }
+)
 
 # These were taken from catkin_pkg's package.py file
 DEPENDENCY_TYPES = [
@@ -59,6 +66,24 @@ DEPENDENCY_TYPES = [
     "doc_depends",
 ]
 
+# The dependency types in which gz libraries are replaced by their vendor packages
+VENDORED_DEPENDENCY_TYPES = [
+    "build_depends",
+    "exec_depends",
+    "test_depends",
+    "doc_depends",
+]
+
+# Characters allowed in a package name before the version number starts
+_PKG_NAME_CHARS = "-_abcdefghijklmnopqrstuvwxyz"
+_GZ_DESIG_RE = re.compile(r"gz-(.*)")
+# Matches the name of any gz library followed by an optional version, i.e.
+# the names for which `remove_version(name) in GZ_LIBRARIES`. The captured
+# group is the unversioned library name.
+_GZ_LIBRARY_RE = re.compile(
+    "(" + "|".join(re.escape(lib) for lib in sorted(GZ_LIBRARIES)) + ")(?![-_a-z])"
+)
+
 
 def filter_dependencies(package: Package):
 
@@ -71,56 +96,72 @@ def filter_dependencies(package: Package):
     return package
 
 
+@functools.lru_cache(maxsize=None)
 def remove_version(pkg_name: str):
-    pkg_name_no_version = re.match("[-_a-z]*", pkg_name)
-    if not pkg_name_no_version:
-        raise RuntimeError("Could not parse package name")
-    return pkg_name_no_version.group(0)
+    # Equivalent to matching "[-_a-z]*", but without going through the regex
+    # engine since this is called for every dependency.
+    version = pkg_name.lstrip(_PKG_NAME_CHARS)
+    return pkg_name[: len(pkg_name) - len(version)]
 
 
+@functools.lru_cache(maxsize=None)
 def create_vendor_name(pkg_name: str):
     return f"{pkg_name.replace('-', '_')}_vendor"
 
 
-def is_gz_library(dep: Dependency):
+@functools.lru_cache(maxsize=None)
+def _vendor_name_for(name: str):
+    # Returns None if `name` is not a gz library.
     # For the purposes of this tool, ogre-next and dartsim are considered gz libraries,
     # thus, we'll use vendored versions of those packages.
-    if dep.name in EXTRA_VENDORED_PKGS.keys():
-        return True
-    pkg_name_no_version = remove_version(dep.name)
-    return pkg_name_no_version in GZ_LIBRARIES
-
-
-def vendorize_gz_dependency(dep: Dependency):
-    if dep.name in EXTRA_VENDORED_PKGS:
-        dep.name = EXTRA_VENDORED_PKGS[dep.name]
-        return
-    pkg_name_no_version = remove_version(dep.name)
-    dep.name = create_vendor_name(pkg_name_no_version)
-
-
-def separate_gz_deps(deps):
+    if name in EXTRA_VENDORED_PKGS:
+        return EXTRA_VENDORED_PKGS[name]
+    if name in GZ_LIBRARIES:
+        return create_vendor_name(name)
+    # The same match both classifies the name and gives its unversioned form.
+    # Names of system dependencies fail on the first characters, and the result
+    # is cached per name, so no separate prefix check is needed.
+    gz_match = _GZ_LIBRARY_RE.match(name)
+    if gz_match is None:
+        return None
+    return create_vendor_name(gz_match.group(1))
+
+
+def separate_and_vendorize_deps(deps):
+    # Classify and vendorize in a single pass with one cached lookup per
+    # dependency. The gz dependencies are renamed on a copy to leave `deps`
+    # untouched.
     gz_deps = []
     non_gz_deps = []
     for dep in deps:
-        if is_gz_library(dep):
-            gz_deps.append(dep)
-        else:
+        vendor_name = _vendor_name_for(dep.name)
+        if vendor_name is None:
             non_gz_deps.append(dep)
+        else:
+            vendor_dep = copy.copy(dep)
+            vendor_dep.name = vendor_name
+            gz_deps.append(vendor_dep)
     return gz_deps, non_gz_deps
 
 
-def split_version(version: str):
-    match = re.match(r"^(\d+)\.(\d+)\.(\d+)$", version)
-    if match is None:
+@functools.lru_cache(maxsize=None)
+def _parse_version(version: str):
+    new_version = version.split(".")
+    if len(new_version) != 3 or not all(x.isdecimal() for x in new_version):
         raise ValueError(f'Invalid version string, must be int.int.int: "{version}"')
-    new_version = match.groups()
-    new_version = [int(x) for x in new_version]
-    return {"major": new_version[0], "minor": new_version[1], "patch": new_version[2]}
+    return tuple(int(x) for x in new_version)
+
+
+def split_version(version: str):
+    # The parsed version is cached, but a new dict is returned on every call
+    # so that callers can't modify the cached value.
+    major, minor, patch = _parse_version(version)
+    return {"major": major, "minor": minor, "patch": patch}
 
 
+@functools.lru_cache(maxsize=None)
 def get_lib_designator(pkg_name: str):
-    gz_match = re.match(r"gz-(.*)", pkg_name)
+    gz_match = _GZ_DESIG_RE.match(pkg_name)
     if gz_match:
         return gz_match.group(1)
     elif pkg_name == "sdformat":
@@ -130,9 +171,16 @@ def get_lib_designator(pkg_name: str):
 
 
 def stable_unique(items: list):
+    # Dependencies are deduplicated by name rather than by equality: vendorized
+    # dependencies that render to the same name (e.g. dartsim and DART, or the
+    # same library with different version constraints) must only appear once
+    # in the generated files, since catkin rejects repeated dependencies.
+    seen = set()
     unique_items = []
     for item in items:
-        if item not in unique_items:
+        key = getattr(item, "name", item)
+        if key not in seen:
+            seen.add(key)
             unique_items.append(item)
     return unique_items
 
@@ -177,107 +225,157 @@ def github_pkg_name(pkg_name_no_version):
 
 
 def separate_and_vendorize_gz_deps(src_pkg_xml: Package):
-    vendor_pkg_xml = copy.deepcopy(src_pkg_xml)
+    # Only the dependency lists are replaced below, so a shallow copy is enough
+    # to leave `src_pkg_xml` untouched.
+    vendor_pkg_xml = copy.copy(src_pkg_xml)
     # The gazebo dependencies need to be vendored and we need to use `<depend>`
     # on each dependency regardless of whether it's a build or exec dependency
-    gz_build_deps, vendor_pkg_xml.build_depends = separate_gz_deps(
-        vendor_pkg_xml.build_depends
-    )
-    gz_exec_deps, vendor_pkg_xml.exec_depends = separate_gz_deps(
-        vendor_pkg_xml.exec_depends
-    )
-    gz_test_deps, vendor_pkg_xml.test_depends = separate_gz_deps(
-        vendor_pkg_xml.test_depends
-    )
-    gz_doc_deps, vendor_pkg_xml.doc_depends = separate_gz_deps(
-        vendor_pkg_xml.doc_depends
-    )
-
-    gz_deps = stable_unique(gz_build_deps + gz_exec_deps + gz_test_deps + gz_doc_deps)
+    gz_deps = []
+    for dep_type in VENDORED_DEPENDENCY_TYPES:
+        gz_type_deps, non_gz_type_deps = separate_and_vendorize_deps(
+            getattr(src_pkg_xml, dep_type)
+        )
+        gz_deps.extend(gz_type_deps)
+        setattr(vendor_pkg_xml, dep_type, non_gz_type_deps)
 
-    for dep in gz_deps:
-        vendorize_gz_dependency(dep)
+    gz_deps = stable_unique(gz_deps)
 
     return gz_deps, vendor_pkg_xml
 
 
-def create_vendor_package_xml(src_pkg_xml: Package, existing_package: Package | None):
-    templates_path = Path(__file__).resolve().parent / "templates"
-    jinja_env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(templates_path),
+def _bytecode_cache():
+    # Reuse the compiled templates across invocations of this script. The
+    # default cache directory is a per-user directory in the system's
+    # temporary directory. If it can't be used, the templates are simply
+    # compiled on every run.
+    try:
+        return jinja2.FileSystemBytecodeCache(pattern="gz_vendor_%s.cache")
+    except RuntimeError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _jinja_env():
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATES_PATH),
         trim_blocks=True,
         lstrip_blocks=True,
         keep_trailing_newline=True,
+        # The templates don't change while the script runs, so skip checking
+        # whether they are up to date on disk every time they are loaded.
+        auto_reload=False,
+        bytecode_cache=_bytecode_cache(),
     )
-    template = jinja_env.get_template("package.xml.jinja")
-    params = {}
 
-    params["gz_vendor_deps"], params["pkg"] = separate_and_vendorize_gz_deps(
-        src_pkg_xml
-    )
 
-    pkg_name_no_version = remove_version(params["pkg"].name)
-    params["vendor_name"] = create_vendor_name(pkg_name_no_version)
+def get_template(name: str):
+    # The environment is shared by all the generated files, and its template
+    # cache makes sure each template is only parsed and compiled once.
+    return _jinja_env().get_template(name)
 
-    params["vendor_pkg_version"] = (
-        existing_package.version if existing_package is not None else "0.0.1"
-    )
 
-    return template.render(params)
+def prepare_render_context(src_pkg_xml: Package, existing_package: Package | None):
+    # Everything the templates need is derived once per package and shared by
+    # all of them.
+    gz_deps, vendor_pkg_xml = separate_and_vendorize_gz_deps(src_pkg_xml)
+    pkg_name_no_version = remove_version(vendor_pkg_xml.name)
 
+    cmake_args = []
+    if pkg_has_docs(pkg_name_no_version):
+        cmake_args.append("-DBUILD_DOCS:BOOL=OFF")
+    if pkg_has_pybind11(pkg_name_no_version):
+        cmake_args.append("-DSKIP_PYBIND11:BOOL=ON")
+    if pkg_has_swig(pkg_name_no_version):
+        cmake_args.append("-DSKIP_SWIG:BOOL=ON")
 
-def create_cmake_file(src_pkg_xml: Package):
-    templates_path = Path(__file__).resolve().parent / "templates"
-    jinja_env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(templates_path),
-        trim_blocks=True,
-        lstrip_blocks=True,
-        keep_trailing_newline=True,
-    )
-    template = jinja_env.get_template("CMakeLists.txt.jinja")
-    params = {}
-
-    params["gz_vendor_deps"], params["pkg"] = separate_and_vendorize_gz_deps(
-        src_pkg_xml
-    )
+    return {
+        "gz_vendor_deps": gz_deps,
+        "pkg": vendor_pkg_xml,
+        "vendor_name": create_vendor_name(pkg_name_no_version),
+        "vendor_pkg_version": (
+            existing_package.version if existing_package is not None else "0.0.1"
+        ),
+        "github_pkg_name": github_pkg_name(pkg_name_no_version),
+        "cmake_pkg_name": cmake_pkg_name(pkg_name_no_version),
+        "vendor_has_extra_cmake": pkg_has_extra_cmake(pkg_name_no_version),
+        "vendor_has_dsv": pkg_has_dsv(pkg_name_no_version),
+        "has_patches": pkg_has_patches(pkg_name_no_version),
+        "version": split_version(vendor_pkg_xml.version),
+        "cmake_args": cmake_args,
+    }
 
-    pkg_name_no_version = remove_version(params["pkg"].name)
-    params["github_pkg_name"] = github_pkg_name(pkg_name_no_version)
-    params["vendor_name"] = create_vendor_name(pkg_name_no_version)
-    params["cmake_pkg_name"] = cmake_pkg_name(pkg_name_no_version)
 
-    params["vendor_has_extra_cmake"] = pkg_has_extra_cmake(pkg_name_no_version)
-    params["vendor_has_dsv"] = pkg_has_dsv(pkg_name_no_version)
-    params["has_patches"] = pkg_has_patches(pkg_name_no_version)
-    params["version"] = split_version(params["pkg"].version)
+def create_vendor_package_xml(context: dict):
+    return get_template("package.xml.jinja").render(context)
 
-    params["cmake_args"] = []
-    if pkg_has_docs(pkg_name_no_version):
-        params["cmake_args"] = ["-DBUILD_DOCS:BOOL=OFF"]
 
-    if pkg_has_pybind11(pkg_name_no_version):
-        params["cmake_args"].append("-DSKIP_PYBIND11:BOOL=ON")
-    if pkg_has_swig(pkg_name_no_version):
-        params["cmake_args"].append("-DSKIP_SWIG:BOOL=ON")
-    return template.render(params)
+def create_cmake_file(context: dict):
+    return get_template("CMakeLists.txt.jinja").render(context)
 
 
 def generate_vendor_package_files(
     package: Package, existing_package: Package | None, output_dir
 ):
     filtered_package = filter_dependencies(package)
-    output_package_xml = create_vendor_package_xml(filtered_package, existing_package)
-    output_cmake = create_cmake_file(filtered_package)
+    context = prepare_render_context(filtered_package, existing_package)
+    output_package_xml = create_vendor_package_xml(context)
+    output_cmake = create_cmake_file(context)
+    # Both templates are rendered before either file is written so that a
+    # failure doesn't leave a partially regenerated vendor package behind.
     if output_dir:
-        with open(Path(output_dir) / "package.xml", "w") as f:
-            f.write(output_package_xml)
-        with open(Path(output_dir) / "CMakeLists.txt", "w") as f:
-            f.write(output_cmake)
+        output_path = Path(output_dir)
+        (output_path / "package.xml").write_text(
+            output_package_xml, encoding="utf-8", newline=""
+        )
+        (output_path / "CMakeLists.txt").write_text(
+            output_cmake, encoding="utf-8", newline=""
+        )
     else:
         print(output_package_xml)
         print(output_cmake)
 
 
+def generate_vendor_package(package: Package, output_dir: str | None = None):
+    # Library entry point for generating a vendor package from an already
+    # parsed upstream package.xml, e.g. when processing several libraries
+    # in one run. `main` is a thin command line wrapper around it.
+    pkg_name_no_version = remove_version(package.name)
+    vendor_name = create_vendor_name(pkg_name_no_version)
+
+    if not output_dir:
+        output_dir = vendor_name
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    existing_package_path = Path(output_dir) / "package.xml"
+    try:
+        existing_package = parse_package(existing_package_path)
+    except InvalidPackage as e:
+        print(f"Error parsing '{existing_package_path}")
+        raise e
+
+    generate_vendor_package_files(package, existing_package, output_dir)
+
+    # Copy other files
+    for file in ["LICENSE", "CONTRIBUTING.md"]:
+        shutil.copyfile(TEMPLATES_PATH / file, Path(output_dir) / file)
+
+    shutil.copyfile(
+        TEMPLATES_PATH / "config.cmake.in",
+        Path(output_dir) / f"{cmake_pkg_name(pkg_name_no_version)}-config.cmake.in",
+    )
+    shutil.copyfile(
+        TEMPLATES_PATH / "extras.cmake.in",
+        Path(output_dir) / f"{vendor_name}-extras.cmake.in",
+    )
+
+    if pkg_has_dsv(pkg_name_no_version):
+        shutil.copyfile(
+            TEMPLATES_PATH / "vendor.dsv.in",
+            Path(output_dir) / f"{vendor_name}.dsv.in",
+        )
+
+
 def main(argv=sys.argv[1:]):
     parser = argparse.ArgumentParser(
         description="Parse package.xml file and generate a vendor package",
@@ -303,46 +401,7 @@ def main(argv=sys.argv[1:]):
     finally:
         args.input_package_xml.close()
 
-    pkg_name_no_version = remove_version(package.name)
-    vendor_name = create_vendor_name(pkg_name_no_version)
-
-    if not args.output_dir:
-        args.output_dir = vendor_name
-
-    try:
-        os.mkdir(args.output_dir)
-    except FileExistsError:
-        pass
-
-    existing_package_path = Path(args.output_dir) / "package.xml"
-    try:
-        existing_package = parse_package(existing_package_path)
-    except InvalidPackage as e:
-        print(f"Error parsing '{existing_package_path}")
-        raise e
-
-    generate_vendor_package_files(package, existing_package, args.output_dir)
-
-    templates_path = Path(__file__).resolve().parent / "templates"
-    # Copy other files
-    for file in ["LICENSE", "CONTRIBUTING.md"]:
-        shutil.copy(templates_path / file, Path(args.output_dir) / file)
-
-    shutil.copy(
-        templates_path / "config.cmake.in",
-        Path(args.output_dir)
-        / f"{cmake_pkg_name(pkg_name_no_version)}-config.cmake.in",
-    )
-    shutil.copy(
-        templates_path / "extras.cmake.in",
-        Path(args.output_dir) / f"{vendor_name}-extras.cmake.in",
-    )
-
-    if pkg_has_dsv(pkg_name_no_version):
-        shutil.copy(
-            templates_path / "vendor.dsv.in",
-            Path(args.output_dir) / f"{vendor_name}.dsv.in",
-        )
+    generate_vendor_package(package, args.output_dir)
 
 
 if __name__ == "__main__":